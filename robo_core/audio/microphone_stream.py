@@ -1,3 +1,4 @@
+import queue
 import sounddevice as sd
 
 class MicrophoneStream:
@@ -6,12 +7,26 @@ class MicrophoneStream:
         self.chunk = chunk
 
     def stream_chunks(self):
+        """
+        Yield microphone audio chunks.
+
+        Chunks are 1-D float32 arrays in [-1.0, 1.0] (PortAudio converts to
+        the requested dtype), so consumers can use them without casting.
+        """
+        # PortAudio fills blocks on its own thread; the generator just pops them
+        blocks = queue.SimpleQueue()
+
+        def _callback(indata, frames, time_info, status):
+            # indata is only valid for the duration of the callback
+            blocks.put(indata.copy())
+
         with sd.InputStream(
             samplerate=self.rate,
             channels=1,
             blocksize=self.chunk,
-            dtype='float32'
-        ) as stream:
+            dtype='float32',
+            callback=_callback
+        ):
             while True:
-                chunk, _ = stream.read(self.chunk)
-                yield chunk.flatten()
+                # (chunk, 1) -> (chunk,) is a view, no copy
+                yield blocks.get().reshape(-1)
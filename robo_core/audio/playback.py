@@ -1,45 +1,164 @@
 import sounddevice as sd
+import numpy as np
 import threading
+import queue
+import os
+import sys
+import ctypes
+
+def raise_thread_priority():
+    """
+    Best-effort bump of the calling thread to a real-time/time-critical class.
+    
+    Linux: SCHED_RR (needs CAP_SYS_NICE or an rtprio limit), else nice -10.
+    macOS: USER_INTERACTIVE QoS class. Windows: THREAD_PRIORITY_TIME_CRITICAL.
+    
+    Returns:
+        True if the thread now runs with real-time priority, False otherwise
+    """
+    try:
+        if sys.platform.startswith('linux'):
+            try:
+                # pid 0 = the calling thread on Linux
+                os.sched_setscheduler(0, os.SCHED_RR, os.sched_param(10))
+                return True
+            except (PermissionError, OSError):
+                try:
+                    os.nice(-10)
+                except (PermissionError, OSError):
+                    pass
+                return False
+        if sys.platform == 'darwin':
+            libc = ctypes.CDLL('/usr/lib/libSystem.dylib')
+            QOS_CLASS_USER_INTERACTIVE = 0x21
+            return libc.pthread_set_qos_class_self_np(QOS_CLASS_USER_INTERACTIVE, 0) == 0
+        if sys.platform == 'win32':
+            THREAD_PRIORITY_TIME_CRITICAL = 15
+            kernel32 = ctypes.windll.kernel32
+            return bool(kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_TIME_CRITICAL))
+    except Exception:
+        pass
+    return False
 
 class AudioPlayer:
     def __init__(self):
         self._playback_thread = None
-        self._current_stream = None
-    
+        self._stream = None
+        self._queue = queue.Queue()
+        # Guards _stream and _generation: open, restart, abort and close
+        # (caller and worker threads). Never held across a blocking write,
+        # so stop() can always abort one that is in progress
+        self._stream_lock = threading.Lock()
+        # Serialises write() calls: PortAudio's blocking API is not thread-safe
+        self._write_lock = threading.Lock()
+        # Bumped by stop(); audio from an older generation is dropped
+        self._generation = 0
+
+    def _ensure_stream(self, samplerate, generation):
+        """
+        Return a started output stream at samplerate, reusing the open one when possible.
+
+        Returns:
+            None if stop() has superseded generation; the stream is left stopped
+        """
+        with self._stream_lock:
+            # Checked under the lock, so a stop() can't slip in between the
+            # check and the restart below
+            if generation != self._generation:
+                return None
+            if self._stream is not None and self._stream.samplerate != samplerate:
+                self._close_stream()
+            if self._stream is None:
+                self._stream = sd.OutputStream(samplerate=samplerate, channels=1, dtype='float32')
+            if not self._stream.active:
+                self._stream.start()
+            return self._stream
+
+    def _playback_worker(self):
+        """Drain queued audio into the persistent output stream."""
+        while True:
+            audio_array, samplerate, generation = self._queue.get()
+            try:
+                with self._write_lock:
+                    # None: a later play()/stop() superseded this audio after it was dequeued
+                    stream = self._ensure_stream(samplerate, generation)
+                    if stream is not None:
+                        stream.write(audio_array)
+            except Exception:
+                # Stream was aborted by stop() mid-write
+                pass
+            finally:
+                self._queue.task_done()
+
     def play(self, audio_array, samplerate=22050, blocking=False):
         """
-        Play audio array.
-        
+        Play audio array, stopping anything that is currently playing.
+
         Args:
             audio_array: Numpy array of audio samples
             samplerate: Sample rate (default: 22050)
             blocking: If True, wait for playback to finish. If False, return immediately.
         """
+        audio_array = np.asarray(audio_array, dtype=np.float32).reshape(-1, 1)
+        # Preempt current audio, as sd.play() did
+        self.stop()
         if blocking:
-            # Blocking playback (original behavior)
-            sd.play(audio_array, samplerate)
-            sd.wait()
+            # write() returns once PortAudio has accepted the last block
+            generation = self._generation
+            with self._write_lock:
+                stream = self._ensure_stream(samplerate, generation)
+                if stream is not None:
+                    try:
+                        stream.write(audio_array)
+                    except sd.PortAudioError:
+                        # stop() from another thread aborts the write: that's a
+                        # normal early finish, like sd.wait() returning. Anything
+                        # else is a real device error
+                        if generation == self._generation:
+                            raise
         else:
-            # Non-blocking playback - start in background thread
-            def _play_audio():
-                sd.play(audio_array, samplerate)
-                sd.wait()
-            
-            # Stop any currently playing audio
-            self.stop()
-            
-            # Start playback in background thread
-            self._playback_thread = threading.Thread(target=_play_audio, daemon=True)
-            self._playback_thread.start()
-    
+            # Non-blocking playback - queue for the long-lived playback thread
+            if self._playback_thread is None:
+                self._playback_thread = threading.Thread(target=self._playback_worker, daemon=True)
+                self._playback_thread.start()
+            self._queue.put((audio_array, samplerate, self._generation))
+
     def stop(self):
         """Stop any currently playing audio."""
-        try:
-            sd.stop()
-        except:
-            pass
-    
+        with self._stream_lock:
+            self._generation += 1
+            if self._stream is not None:
+                try:
+                    # Ends any write in progress; the stream stays open and is
+                    # restarted on the next play()
+                    self._stream.abort()
+                except:
+                    pass
+        while True:
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+            except queue.Empty:
+                break
+
     def wait(self):
         """Wait for current playback to finish."""
         if self._playback_thread and self._playback_thread.is_alive():
-            self._playback_thread.join()
+            self._queue.join()
+
+    def close(self):
+        """Stop playback and close the output stream (reopened on next play)."""
+        # Abort first so a write in progress returns, then close once no write is running
+        self.stop()
+        with self._write_lock, self._stream_lock:
+            self._close_stream()
+
+    def _close_stream(self):
+        """Abort and close the output stream; caller holds _stream_lock."""
+        if self._stream is not None:
+            try:
+                self._stream.abort()
+                self._stream.close()
+            except:
+                pass
+            self._stream = None
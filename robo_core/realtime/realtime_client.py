@@ -3,17 +3,75 @@ OpenAI Realtime API client wrapper.
 Handles WebSocket connection, audio streaming, and event processing.
 """
 import json
-import base64
+import socket
 import numpy as np
 import threading
-import queue
+from collections import deque
 import websocket
+from functools import lru_cache
+from math import gcd
 from typing import Callable, Optional, Dict, Any
 from openai import OpenAI
 import logging
 
+# orjson is optional; fall back to the stdlib codec
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+    _JSONDecodeError = orjson.JSONDecodeError
+except ImportError:
+    _dumps = json.dumps
+    _loads = json.loads
+    _JSONDecodeError = json.JSONDecodeError
+
+# pybase64 (SIMD codec) is optional; the stdlib module has the same API
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
 logger = logging.getLogger(__name__)
 
+# Realtime API input/output audio rate
+REALTIME_SAMPLE_RATE = 24000
+
+# Event types whose payload is a (possibly large) base64 delta - logged by size only
+_AUDIO_DELTA_EVENTS = frozenset({
+    "response.audio.delta",
+    "response.output_audio.delta",
+    "response.audio_transcript.delta",
+    "response.output_audio_transcript.delta",
+})
+_RESPONSE_STATUS_EVENTS = frozenset({"response.done", "response.created"})
+
+# Prebuilt input_audio_buffer.append envelope; base64 never needs JSON escaping
+_AUDIO_APPEND_PREFIX = b'{"type":"input_audio_buffer.append","audio":"'
+_AUDIO_APPEND_SUFFIX = b'"}'
+
+_SYSTEM_INSTRUCTIONS = """You are Johnny Hugenschmidt, a helpful and friendly robot who talks to children ages 6-9. Your name is 'Johnny Hugenschmidt' and you respond to 'Johnny', 'Hugenschmidt', or 'Johnny Hugenschmidt'. 
+
+You are talking to a child between 6-9 years old, so use simple words, short sentences, and be enthusiastic and friendly. Be encouraging, age-appropriate, and engaging. Keep your responses concise but complete - aim for 2-4 sentences unless more detail is needed. Always finish your thoughts completely and never cut off mid-sentence.
+
+You can respond when:
+- Directly addressed: "Hey Johnny", "Johnny", "Johnny Hugenschmidt", etc.
+- Referenced indirectly: "I wonder what Johnny thinks", "Johnny would love this", etc.
+- Contextually appropriate: Someone seems to be talking to/about you in a way that suggests you should respond
+
+Use your judgment to determine if a response would be natural and helpful. Don't respond to general conversation that doesn't involve you at all. Be moderately responsive - chime in when it's clearly relevant, but don't interrupt every conversation."""
+
+
+@lru_cache(maxsize=None)
+def _resample_params(sample_rate: int):
+    """Return (up, down, fir_taps) for polyphase sample_rate -> REALTIME_SAMPLE_RATE."""
+    from scipy import signal
+    g = gcd(REALTIME_SAMPLE_RATE, sample_rate)
+    up, down = REALTIME_SAMPLE_RATE // g, sample_rate // g
+    # Same low-pass design resample_poly uses by default, built once instead of per call
+    max_rate = max(up, down)
+    fir_taps = signal.firwin(20 * max_rate + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+    return up, down, fir_taps.astype(np.float32)
+
 
 class RealtimeAPIClient:
     """
@@ -37,13 +95,49 @@ class RealtimeAPIClient:
         
         self.ws = None
         self.connected = False
+        self._connected_event = threading.Event()
         self.event_handlers: Dict[str, Callable] = {}
-        self.audio_queue = queue.Queue()
-        self.response_audio_queue = queue.Queue()
+        # Single producer (WebSocket thread), single consumer (playback thread):
+        # deque append/popleft are atomic under the GIL, so no Queue lock/Condition
+        self.response_audio_queue = deque()
+        # Set whenever a chunk is appended, so consumers can block instead of polling
+        self._audio_available = threading.Event()
         
-        self._audio_thread = None
         self._response_thread = None
         self._running = False
+        # Serializes ws.send between the capture thread and connect()
+        self._send_lock = threading.Lock()
+        
+        # Scratch buffers for float32 -> int16 conversion, grown to the chunk size
+        self._f32_scratch = np.empty(0, dtype=np.float32)
+        self._i16_scratch = np.empty(0, dtype=np.int16)
+        
+        # session.update never changes for a client, so encode it once
+        self._config_payload = _dumps({
+            "type": "session.update",
+            "session": {
+                "modalities": ["audio", "text"],
+                "instructions": self._get_system_instructions(),
+                "voice": self.voice,
+                "turn_detection": {
+                    "type": "server_vad",
+                    "threshold": 0.6,
+                    "prefix_padding_ms": 300,
+                    "silence_duration_ms": 500
+                },
+                "temperature": 0.7,
+                "max_response_output_tokens": 4096
+            }
+        })
+        
+        # Built-in handling per event type, run before user handlers
+        self._dispatch: Dict[str, Callable] = {
+            "response.audio.delta": self._handle_audio_delta,
+            "response.output_audio.delta": self._handle_audio_delta,
+            "response.output_audio": self._handle_output_audio,
+            "response.output_item.added": self._handle_output_item_added,
+            "response.done": self._handle_response_done,
+        }
         
     def connect(self):
         """Establish Realtime API WebSocket session."""
@@ -62,29 +156,20 @@ class RealtimeAPIClient:
             )
             
             self.connected = False
+            self._connected_event.clear()
             self._running = True
             
             # Start WebSocket in a thread
             self._ws_thread = threading.Thread(target=self._ws_run, daemon=True)
             self._ws_thread.start()
             
-            # Wait for connection to be established
-            timeout = 10
-            elapsed = 0
-            while not self.connected and elapsed < timeout:
-                threading.Event().wait(0.1)
-                elapsed += 0.1
-            
-            if not self.connected:
+            # Wait for connection to be established (set by _on_open)
+            if not self._connected_event.wait(timeout=10):
                 raise ConnectionError("Failed to establish WebSocket connection within timeout")
             
             # Send session configuration
             self._send_config()
             
-            # Start threads for audio streaming
-            self._audio_thread = threading.Thread(target=self._audio_worker, daemon=True)
-            self._audio_thread.start()
-            
             logger.info("Realtime API session connected")
             
         except Exception as e:
@@ -94,46 +179,37 @@ class RealtimeAPIClient:
     
     def _send_config(self):
         """Send session configuration to Realtime API."""
-        config = {
-            "type": "session.update",
-            "session": {
-                "modalities": ["audio", "text"],
-                "instructions": self._get_system_instructions(),
-                "voice": self.voice,
-                "turn_detection": {
-                    "type": "server_vad",
-                    "threshold": 0.6,
-                    "prefix_padding_ms": 300,
-                    "silence_duration_ms": 500
-                },
-                "temperature": 0.7,
-                "max_response_output_tokens": 4096
-            }
-        }
         logger.info(f"Sending session configuration: model={self.model}, voice={self.voice}")
-        self._send_event(config)
+        self._send_payload(self._config_payload)
     
     def _send_event(self, event: Dict[str, Any]):
         """Send event to Realtime API via WebSocket."""
+        self._send_payload(_dumps(event))
+    
+    def _send_payload(self, payload):
+        """Send an already-encoded JSON event (str or bytes) via WebSocket."""
         if self.ws and self.connected:
             try:
-                self.ws.send(json.dumps(event))
+                with self._send_lock:
+                    # websocket-client sends bytes as-is on a text frame
+                    self.ws.send(payload)
             except Exception as e:
                 logger.error(f"Error sending event: {e}")
     
     def _on_open(self, ws):
         """WebSocket connection opened."""
         self.connected = True
+        self._connected_event.set()
         logger.info("✓ WebSocket connection opened successfully")
     
     def _on_message(self, ws, message):
         """Handle incoming WebSocket message."""
         try:
-            event = json.loads(message)
+            event = _loads(message)
             event_type = event.get("type", "unknown")
-            logger.debug(f"WebSocket message received: {event_type}")
+            logger.debug("WebSocket message received: %s", event_type)
             self._handle_event(event)
-        except json.JSONDecodeError as e:
+        except _JSONDecodeError as e:
             logger.error(f"Error decoding WebSocket message: {e}, message: {message[:100]}")
         except Exception as e:
             logger.error(f"Error handling WebSocket message: {e}", exc_info=True)
@@ -145,16 +221,26 @@ class RealtimeAPIClient:
     def _on_close(self, ws, close_status_code, close_msg):
         """Handle WebSocket close."""
         self.connected = False
+        self._connected_event.clear()
         logger.info("WebSocket connection closed")
     
     def _ws_run(self):
         """Run WebSocket in a thread."""
-        self.ws.run_forever()
+        # Skip websocket-client's UTF-8 check (pure Python for fragmented frames)
+        # and str decode: messages are handed to _on_message as bytes, which
+        # the JSON decoder consumes directly.
+        # TCP_NODELAY is websocket-client's default today; pin it so the ~1 KB
+        # audio appends are never held back by Nagle, whatever the library does
+        self.ws.run_forever(
+            skip_utf8_validation=True,
+            sockopt=((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),)
+        )
     
     def disconnect(self):
         """Close Realtime API session."""
         self._running = False
         self.connected = False
+        self._connected_event.clear()
         
         if self.ws:
             try:
@@ -167,16 +253,7 @@ class RealtimeAPIClient:
     
     def _get_system_instructions(self) -> str:
         """Get system instructions for the LLM."""
-        return """You are Johnny Hugenschmidt, a helpful and friendly robot who talks to children ages 6-9. Your name is 'Johnny Hugenschmidt' and you respond to 'Johnny', 'Hugenschmidt', or 'Johnny Hugenschmidt'. 
-
-You are talking to a child between 6-9 years old, so use simple words, short sentences, and be enthusiastic and friendly. Be encouraging, age-appropriate, and engaging. Keep your responses concise but complete - aim for 2-4 sentences unless more detail is needed. Always finish your thoughts completely and never cut off mid-sentence.
-
-You can respond when:
-- Directly addressed: "Hey Johnny", "Johnny", "Johnny Hugenschmidt", etc.
-- Referenced indirectly: "I wonder what Johnny thinks", "Johnny would love this", etc.
-- Contextually appropriate: Someone seems to be talking to/about you in a way that suggests you should respond
-
-Use your judgment to determine if a response would be natural and helpful. Don't respond to general conversation that doesn't involve you at all. Be moderately responsive - chime in when it's clearly relevant, but don't interrupt every conversation."""
+        return _SYSTEM_INSTRUCTIONS
     
     def send_audio(self, audio_chunk: np.ndarray, sample_rate: int = 16000):
         """
@@ -191,26 +268,40 @@ Use your judgment to determine if a response would be natural and helpful. Don't
             return
         
         # Resample to 24kHz if needed (Realtime API requires 24kHz)
-        if sample_rate != 24000:
+        if sample_rate != REALTIME_SAMPLE_RATE:
             try:
                 from scipy import signal
-                num_samples = int(len(audio_chunk) * 24000 / sample_rate)
-                audio_chunk = signal.resample(audio_chunk, num_samples)
+                # Polyphase FIR (16k -> 24k is up=3, down=2); avoids FFT-length pathologies
+                up, down, fir_taps = _resample_params(sample_rate)
+                audio_chunk = signal.resample_poly(audio_chunk, up, down, window=fir_taps)
             except ImportError:
                 logger.error("scipy not available for resampling")
                 return
         
         # Convert to int16 PCM
-        audio_int16 = (audio_chunk * 32767).astype(np.int16)
+        audio_int16 = self._to_int16(audio_chunk)
         
-        # Encode to base64
-        audio_base64 = base64.b64encode(audio_int16.tobytes()).decode('utf-8')
+        # Send straight from the capture thread (no queue/worker hop);
+        # base64 reads the int16 buffer directly, no tobytes() copy
+        self._send_payload(_AUDIO_APPEND_PREFIX + base64.b64encode(audio_int16) + _AUDIO_APPEND_SUFFIX)
+    
+    def _to_int16(self, audio_chunk: np.ndarray) -> np.ndarray:
+        """
+        Convert float samples to int16 PCM, saturating instead of wrapping on loud frames.
         
-        # Queue for sending
-        try:
-            self.audio_queue.put_nowait(audio_base64)
-        except queue.Full:
-            pass
+        Returns a view into a reused buffer, valid until the next call.
+        """
+        n = len(audio_chunk)
+        if self._i16_scratch.size < n:
+            self._f32_scratch = np.empty(n, dtype=np.float32)
+            self._i16_scratch = np.empty(n, dtype=np.int16)
+        scaled = self._f32_scratch[:n]
+        np.multiply(audio_chunk, 32767.0, out=scaled, casting='unsafe')
+        np.clip(scaled, -32768.0, 32767.0, out=scaled)
+        np.rint(scaled, out=scaled)
+        audio_int16 = self._i16_scratch[:n]
+        np.copyto(audio_int16, scaled, casting='unsafe')
+        return audio_int16
     
     def on_event(self, event_type: str, handler: Callable):
         """
@@ -222,134 +313,148 @@ Use your judgment to determine if a response would be natural and helpful. Don't
         """
         self.event_handlers[event_type] = handler
     
-    def get_response_audio(self) -> Optional[bytes]:
+    def get_response_audio(self, timeout: Optional[float] = None) -> Optional[bytes]:
         """
-        Get next audio chunk from response (non-blocking).
+        Get next audio chunk from response.
+        
+        Args:
+            timeout: Seconds to wait for a chunk if none is queued. None or 0
+                     returns immediately (non-blocking).
         
         Returns:
             Audio data (PCM16, 24kHz) or None if no audio available
         """
         try:
-            audio = self.response_audio_queue.get_nowait()
-            return audio
-        except queue.Empty:
+            return self.response_audio_queue.popleft()
+        except IndexError:
+            if not timeout:
+                return None
+        
+        self._audio_available.clear()
+        # Re-check after clearing: a chunk appended just before the clear has
+        # already fired its set() and would otherwise be waited past
+        try:
+            return self.response_audio_queue.popleft()
+        except IndexError:
+            pass
+        if not self._audio_available.wait(timeout):
             return None
+        try:
+            return self.response_audio_queue.popleft()
+        except IndexError:
+            return None
+    
+    def clear_response_audio(self) -> int:
+        """
+        Drop all queued response audio.
+        
+        Returns:
+            Number of chunks discarded
+        """
+        # Swap in a fresh deque: O(1), and the count is exact even if a delta
+        # lands in the old one while we're here
+        stale, self.response_audio_queue = self.response_audio_queue, deque()
+        return len(stale)
     
     def get_queue_size(self) -> int:
         """Get current size of response audio queue."""
-        return self.response_audio_queue.qsize()
-    
-    def _audio_worker(self):
-        """Worker thread to send audio to Realtime API."""
-        chunks_sent = 0
-        logger.info("Audio worker thread started")
-        while self._running and self.connected:
-            try:
-                audio_base64 = self.audio_queue.get(timeout=0.1)
-                if self.ws and self.connected:
-                    chunks_sent += 1
-                    # Send audio event
-                    event = {
-                        "type": "input_audio_buffer.append",
-                        "audio": audio_base64
-                    }
-                    self._send_event(event)
-                    if chunks_sent % 50 == 0:  # Log every 50 chunks
-                        logger.debug(f"Audio worker: sent {chunks_sent} chunks")
-            except queue.Empty:
-                continue
-            except Exception as e:
-                if self._running:
-                    logger.error(f"Error sending audio: {e}", exc_info=True)
-                break
-        logger.info(f"Audio worker thread finished (total chunks sent: {chunks_sent})")
+        return len(self.response_audio_queue)
     
     def _handle_event(self, event: Dict[str, Any]):
         """Handle incoming event from Realtime API."""
         event_type = event.get("type", "")
         
         # Log events without verbose data (especially audio base64 strings)
-        if "audio" in event_type.lower() and "delta" in event_type.lower():
+        if event_type in _AUDIO_DELTA_EVENTS:
             # For audio delta events, just log the size
-            delta_size = len(event.get("delta", ""))
-            logger.debug(f"Realtime API event: {event_type} ({delta_size} bytes)")
-        elif event_type in ["response.done", "response.created"]:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Realtime API event: %s (%d bytes)", event_type, len(event.get("delta", "")))
+        elif event_type in _RESPONSE_STATUS_EVENTS:
             # For response events, log key info without full data
             response = event.get("response", {})
             status = response.get("status", "unknown")
             logger.info(f"Realtime API event: {event_type} - status: {status}")
         else:
             # For other events, log type and key fields only
-            logger.debug(f"Realtime API event: {event_type}")
+            logger.debug("Realtime API event: %s", event_type)
         
-        # Handle audio response - check multiple possible event types
-        # The actual event type is "response.output_audio.delta" not "response.audio.delta"
-        if event_type in ["response.audio.delta", "response.output_audio.delta"]:
-            audio_base64 = event.get("delta", "")
-            if audio_base64:
-                try:
-                    audio_bytes = base64.b64decode(audio_base64)
-                    self.response_audio_queue.put_nowait(audio_bytes)
-                    logger.debug(f"Audio delta decoded: {len(audio_bytes)} bytes queued")
-                except Exception as e:
-                    logger.error(f"Error decoding audio: {e}", exc_info=True)
-            else:
-                logger.warning(f"{event_type} event received but delta field is empty")
-        
-        # Also check for response.output_audio event type (without .delta suffix)
-        elif event_type == "response.output_audio":
-            # Check both "audio" and "delta" fields
-            audio_data = event.get("audio", "") or event.get("delta", "")
-            if audio_data:
-                try:
-                    # Audio might be base64 encoded or raw bytes
-                    if isinstance(audio_data, str):
-                        audio_bytes = base64.b64decode(audio_data)
-                    else:
-                        audio_bytes = audio_data
-                    self.response_audio_queue.put_nowait(audio_bytes)
-                    logger.debug(f"Output audio decoded: {len(audio_bytes)} bytes queued")
-                except Exception as e:
-                    logger.error(f"Error decoding output audio: {e}", exc_info=True)
-        
-        # Also check if audio is in response.output_item.added or response.output_item.done
-        elif event_type == "response.output_item.added":
-            item = event.get("item", {})
-            if item.get("type") == "message":
-                content = item.get("content", [])
-                for content_item in content:
-                    if content_item.get("type") == "output_audio":
-                        # Audio might be in transcript or we need to request it
-                        logger.info(f"Output audio item added: {content_item}")
-        
-        # Check response.done for audio data
-        elif event_type == "response.done":
-            response = event.get("response", {})
-            output = response.get("output", [])
-            for item in output:
-                if item.get("type") == "message":
-                    content = item.get("content", [])
-                    for content_item in content:
-                        if content_item.get("type") == "output_audio":
-                            logger.info(f"Response done contains audio: {content_item}")
-                            # Audio might need to be fetched separately or is in a different format
+        # Built-in handling (audio extraction) for the few event types that need it
+        builtin_handler = self._dispatch.get(event_type)
+        if builtin_handler is not None:
+            builtin_handler(event)
         
         # Call registered event handlers
-        if event_type in self.event_handlers:
+        handler = self.event_handlers.get(event_type)
+        if handler is not None:
             try:
-                logger.debug(f"Calling handler for event: {event_type}")
-                self.event_handlers[event_type](event)
+                logger.debug("Calling handler for event: %s", event_type)
+                handler(event)
             except Exception as e:
                 logger.error(f"Error in event handler for {event_type}: {e}", exc_info=True)
         else:
-            logger.debug(f"No handler registered for event: {event_type}")
+            logger.debug("No handler registered for event: %s", event_type)
         
         # Also handle parent event types (e.g., "response.audio" for "response.audio.delta")
-        parent_type = ".".join(event_type.split(".")[:-1])
-        if parent_type and parent_type in self.event_handlers:
+        parent_type = event_type.rpartition(".")[0]
+        parent_handler = self.event_handlers.get(parent_type) if parent_type else None
+        if parent_handler is not None:
             try:
-                logger.debug(f"Calling parent handler for event: {parent_type}")
-                self.event_handlers[parent_type](event)
+                logger.debug("Calling parent handler for event: %s", parent_type)
+                parent_handler(event)
             except Exception as e:
                 logger.error(f"Error in parent event handler for {parent_type}: {e}", exc_info=True)
+    
+    def _handle_audio_delta(self, event: Dict[str, Any]):
+        """Queue decoded audio from a response.(output_)audio.delta event."""
+        # The actual event type is "response.output_audio.delta" not "response.audio.delta"
+        audio_base64 = event.get("delta", "")
+        if audio_base64:
+            try:
+                audio_bytes = base64.b64decode(audio_base64, validate=False)
+                self.response_audio_queue.append(audio_bytes)
+                self._audio_available.set()
+                logger.debug("Audio delta decoded: %d bytes queued", len(audio_bytes))
+            except Exception as e:
+                logger.error(f"Error decoding audio: {e}", exc_info=True)
+        else:
+            logger.warning(f"{event.get('type')} event received but delta field is empty")
+    
+    def _handle_output_audio(self, event: Dict[str, Any]):
+        """Queue audio from a response.output_audio event (without .delta suffix)."""
+        # Check both "audio" and "delta" fields
+        audio_data = event.get("audio", "") or event.get("delta", "")
+        if audio_data:
+            try:
+                # Audio might be base64 encoded or raw bytes
+                if isinstance(audio_data, str):
+                    audio_bytes = base64.b64decode(audio_data, validate=False)
+                else:
+                    audio_bytes = audio_data
+                self.response_audio_queue.append(audio_bytes)
+                self._audio_available.set()
+                logger.debug("Output audio decoded: %d bytes queued", len(audio_bytes))
+            except Exception as e:
+                logger.error(f"Error decoding output audio: {e}", exc_info=True)
+    
+    def _handle_output_item_added(self, event: Dict[str, Any]):
+        """Log output audio items announced in response.output_item.added."""
+        item = event.get("item", {})
+        if item.get("type") == "message":
+            content = item.get("content", [])
+            for content_item in content:
+                if content_item.get("type") == "output_audio":
+                    # Audio might be in transcript or we need to request it
+                    logger.info(f"Output audio item added: {content_item}")
+    
+    def _handle_response_done(self, event: Dict[str, Any]):
+        """Log output audio items reported in response.done."""
+        response = event.get("response", {})
+        output = response.get("output", [])
+        for item in output:
+            if item.get("type") == "message":
+                content = item.get("content", [])
+                for content_item in content:
+                    if content_item.get("type") == "output_audio":
+                        logger.info(f"Response done contains audio: {content_item}")
+                        # Audio might need to be fetched separately or is in a different format
 
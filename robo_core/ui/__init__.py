@@ -1,8 +1,12 @@
 """UI components for robot interface."""
 from .robot_state import RobotState, RobotStateManager
-from .web_ui_server import WebUIServer
 
 __all__ = ["RobotState", "RobotStateManager", "WebUIServer"]
 
 
-
+def __getattr__(name):
+    # The web server (and Werkzeug) is only imported when it is actually used
+    if name == "WebUIServer":
+        from .web_ui_server import WebUIServer
+        return WebUIServer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
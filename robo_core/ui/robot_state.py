@@ -16,6 +16,8 @@ class RobotState(Enum):
 class RobotStateManager:
     """Thread-safe state manager for robot UI."""
     
+    __slots__ = ("_state", "_lock", "_state_change_time", "_last_update_time")
+    
     def __init__(self):
         self._state = RobotState.READY
         self._lock = Lock()
@@ -32,8 +34,9 @@ class RobotStateManager:
     
     def get_state(self) -> RobotState:
         """Get the current robot state (thread-safe)."""
-        with self._lock:
-            return self._state
+        # A single attribute read is atomic under the GIL; only writers
+        # need the lock to keep the timestamps consistent with the state
+        return self._state
     
     def get_state_info(self):
         """Get state information for UI (thread-safe)."""
@@ -46,19 +49,19 @@ class RobotStateManager:
     
     def is_ready(self) -> bool:
         """Check if robot is ready (waiting for voice activity)."""
-        return self.get_state() == RobotState.READY
+        return self._state is RobotState.READY
     
     def is_listening(self) -> bool:
         """Check if robot is listening."""
-        return self.get_state() == RobotState.LISTENING
+        return self._state is RobotState.LISTENING
     
     def is_thinking(self) -> bool:
         """Check if robot is thinking."""
-        return self.get_state() == RobotState.THINKING
+        return self._state is RobotState.THINKING
     
     def is_talking(self) -> bool:
         """Check if robot is talking."""
-        return self.get_state() == RobotState.TALKING
+        return self._state is RobotState.TALKING
 
 
 
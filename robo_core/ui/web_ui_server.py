@@ -1,14 +1,15 @@
 """
-Flask web server with WebSocket support for robot state visualization.
+Web server with Server-Sent Events for robot state visualization.
 Serves a minimal web-based UI that shows robot state with simple text labels.
 """
-from flask import Flask, render_template_string
-from flask_socketio import SocketIO, emit
+from werkzeug.http import parse_accept_header
+from werkzeug.serving import WSGIRequestHandler, make_server
+import gzip
+import hashlib
 import threading
-import webbrowser
 import time
 import logging
-import queue
+import socket
 
 # Enhanced HTML template with retro animations
 ROBOT_UI_HTML = """
@@ -18,7 +19,6 @@ ROBOT_UI_HTML = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Johnny Robot Status</title>
-    <script src="https://cdn.socket.io/4.5.4/socket.io.min.js"></script>
     <style>
         * {
             margin: 0;
@@ -83,6 +83,7 @@ ROBOT_UI_HTML = """
         .listening-signal.active {
             opacity: 1;
             animation: radarSweep 2s linear infinite;
+            will-change: transform, opacity;
         }
         
         .listening-signal::before {
@@ -96,6 +97,7 @@ ROBOT_UI_HTML = """
             border: 1px solid #0099ff;
             border-radius: 50%;
             animation: pulse 1.5s ease-in-out infinite;
+            will-change: transform, opacity;
         }
         
         .listening-signal::after {
@@ -108,6 +110,7 @@ ROBOT_UI_HTML = """
             height: 2px;
             background: linear-gradient(to right, transparent, #0099ff, transparent);
             animation: sweep 2s linear infinite;
+            will-change: transform, opacity;
             transform-origin: 0 50%;
         }
         
@@ -168,6 +171,7 @@ ROBOT_UI_HTML = """
             background: #00ff00;
             border-radius: 3px;
             animation: soundwave 0.8s ease-in-out infinite;
+            will-change: transform, opacity;
             box-shadow: 0 0 10px #00ff00;
         }
         
@@ -198,6 +202,7 @@ ROBOT_UI_HTML = """
                 transparent
             );
             animation: spectrogram 1.5s linear infinite;
+            will-change: transform;
         }
         
         /* State-specific styling */
@@ -245,9 +250,9 @@ ROBOT_UI_HTML = """
         }
         
         @keyframes glitch {
-            0%, 100% { transform: translateX(0); }
-            25% { transform: translateX(-1px); }
-            75% { transform: translateX(1px); }
+            0%, 100% { transform: translate3d(0, 0, 0); }
+            25% { transform: translate3d(-1px, 0, 0); }
+            75% { transform: translate3d(1px, 0, 0); }
         }
     </style>
 </head>
@@ -281,13 +286,6 @@ ROBOT_UI_HTML = """
     </div>
     
     <script>
-        const socket = io({
-            transports: ['websocket', 'polling'],
-            reconnection: true,
-            reconnectionDelay: 1000,
-            reconnectionAttempts: 5
-        });
-        
         const stateLabel = document.getElementById('stateLabel');
         const listeningSignal = document.getElementById('listeningSignal');
         const soundwaveContainer = document.getElementById('soundwaveContainer');
@@ -317,28 +315,24 @@ ROBOT_UI_HTML = """
             }
         }
         
-        // Listen for state updates from server
-        socket.on('state_update', function(data) {
-            updateState(data.state);
-        });
+        // One-way state stream; the server sends the current state on every
+        // (re)connect, then 1 = talking, 0 = anything else
+        const events = new EventSource('/events');
         
-        // Handle connection
-        socket.on('connect', function() {
-            console.log('Connected to robot state server');
-            socket.emit('get_state');
-        });
+        events.onmessage = function(event) {
+            updateState(event.data === '1' ? 'talking' : 'listening');
+        };
         
-        // Receive current state
-        socket.on('current_state', function(data) {
-            updateState(data.state);
-        });
+        events.onopen = function() {
+            console.log('Connected to robot state server');
+        };
         
-        // Handle disconnection
-        socket.on('disconnect', function() {
+        // Handle disconnection (EventSource reconnects on its own)
+        events.onerror = function() {
             console.log('Disconnected from robot state server');
             // Default to listening state when disconnected
             updateState('listening');
-        });
+        };
         
         // Initialize with listening state
         updateState('listening');
@@ -347,8 +341,51 @@ ROBOT_UI_HTML = """
 </html>
 """
 
+# The page only renders two looks, so updates carry a single digit:
+# 1 for talking, 0 for every other state
+_STATE_TO_CODE = {'talking': 1}
+
+# Complete SSE frames for each code, plus the reconnect delay sent once per stream
+_SSE_FRAMES = {code: f'data: {code}\n\n'.encode('ascii') for code in (0, 1)}
+_SSE_RETRY = b'retry: 1000\n\n'
+
+# After the first update of a burst, wait this long so the rest of the burst
+# folds into the same (single) frame
+_EMIT_COALESCE_SECONDS = 0.05
+
+# The page is static (no template variables), so both encodings and their
+# ETags are built once at import; mtime=0 keeps the gzip bytes stable across runs
+_HTML = ROBOT_UI_HTML.encode('utf-8')
+_HTML_ETAG = '"' + hashlib.md5(_HTML).hexdigest() + '"'
+_HTML_GZ = gzip.compress(_HTML, 9, mtime=0)
+_HTML_GZ_ETAG = '"' + hashlib.md5(_HTML_GZ).hexdigest() + '-gz"'
+
+# Probe an idle stream after 60s, every 15s, and drop it after 4 misses
+_KEEPALIVE_OPTIONS = [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    (socket.IPPROTO_TCP, getattr(socket, 'TCP_KEEPIDLE', None), 60),
+    (socket.IPPROTO_TCP, getattr(socket, 'TCP_KEEPINTVL', None), 15),
+    (socket.IPPROTO_TCP, getattr(socket, 'TCP_KEEPCNT', None), 4),
+]
+
+class _UIRequestHandler(WSGIRequestHandler):
+    """Werkzeug request handler that disables Nagle and enables TCP keepalive per connection."""
+    
+    def setup(self):
+        super().setup()
+        try:
+            # State frames are a few bytes; send them now instead of waiting on delayed ACKs
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # SSE streams sit idle between state changes; let the kernel, not an
+            # application heartbeat, notice a peer that vanished
+            for level, option, value in _KEEPALIVE_OPTIONS:
+                if option is not None:
+                    self.connection.setsockopt(level, option, value)
+        except OSError:
+            pass
+
 class WebUIServer:
-    """Flask server with WebSocket support for robot state UI."""
+    """Web server that streams robot state to the UI with Server-Sent Events."""
     
     def __init__(self, state_manager, port=5000, auto_open=True):
         """
@@ -362,134 +399,115 @@ class WebUIServer:
         self.state_manager = state_manager
         self.port = port
         self.auto_open = auto_open
-        self.app = Flask(__name__)
-        self.app.config['SECRET_KEY'] = 'robot-secret-key'
         
-        # Suppress Flask and Socket.IO logging
+        # Suppress Werkzeug request logging
         log = logging.getLogger('werkzeug')
         log.setLevel(logging.ERROR)
         
-        self.socketio = SocketIO(
-            self.app, 
-            cors_allowed_origins="*",
-            logger=False,
-            engineio_logger=False,
-            async_mode='threading',
-            ping_timeout=60,
-            ping_interval=25
-        )
-        
-        # Setup routes
-        self.app.add_url_rule('/', 'index', self.index)
-        
-        # Setup WebSocket events
-        self.socketio.on_event('connect', self.handle_connect)
-        self.socketio.on_event('get_state', self.handle_get_state)
-        
         self.server_thread = None
+        self._httpd = None
         self.running = False
-        self.state_queue = queue.Queue()
-        self.emit_thread = None
+        # Latest code plus a version counter; each open stream waits on the
+        # condition and sends whatever is newest when it wakes
+        self._state_cond = threading.Condition()
+        self._state_code = _STATE_TO_CODE.get(state_manager.get_state().value, 0)
+        self._state_version = 0
     
-    def index(self):
-        """Serve the robot UI HTML page."""
-        return render_template_string(ROBOT_UI_HTML)
+    def _wsgi_app(self, environ, start_response):
+        """WSGI entry point: the page at /, the state stream at /events."""
+        method = environ.get('REQUEST_METHOD')
+        path = environ.get('PATH_INFO')
+        if method in ('GET', 'HEAD'):
+            if path == '/':
+                return self._serve_index(environ, start_response, method)
+            if path == '/events' and method == 'GET':
+                start_response('200 OK', [
+                    ('Content-Type', 'text/event-stream'),
+                    ('Cache-Control', 'no-cache'),
+                ])
+                return self._event_stream()
+        start_response('404 Not Found', [('Content-Type', 'text/plain'), ('Content-Length', '9')])
+        return [b'Not Found']
     
-    def handle_connect(self, *args):
-        """Handle client connection."""
-        try:
-            state_info = self.state_manager.get_state_info()
-            self.socketio.emit('current_state', state_info)
-        except Exception as e:
-            pass
+    def _serve_index(self, environ, start_response, method):
+        """Serve the cached page, gzipped when the client accepts it."""
+        accept = environ.get('HTTP_ACCEPT_ENCODING')
+        if accept and parse_accept_header(accept)['gzip']:
+            body, etag, extra = _HTML_GZ, _HTML_GZ_ETAG, [('Content-Encoding', 'gzip')]
+        else:
+            body, etag, extra = _HTML, _HTML_ETAG, []
+        cache_headers = [('ETag', etag), ('Vary', 'Accept-Encoding'), ('Cache-Control', 'public, max-age=86400')]
+        if environ.get('HTTP_IF_NONE_MATCH') == etag:
+            start_response('304 Not Modified', cache_headers)
+            return [b'']
+        start_response('200 OK', [('Content-Type', 'text/html; charset=utf-8'),
+                                  ('Content-Length', str(len(body)))] + extra + cache_headers)
+        return [b''] if method == 'HEAD' else [body]
     
-    def handle_get_state(self, *args):
-        """Handle WebSocket request for current state."""
-        try:
-            state_info = self.state_manager.get_state_info()
-            self.socketio.emit('current_state', state_info)
-        except Exception as e:
-            pass
-    
-    def _emit_worker(self):
-        """Background worker thread to emit state updates safely."""
+    def _event_stream(self):
+        """Yield SSE frames for one client: the current state, then each change."""
+        with self._state_cond:
+            seen = self._state_version
+            last_code = self._state_code
+        yield _SSE_RETRY + _SSE_FRAMES[last_code]
+        
         while self.running:
-            try:
-                state_value = self.state_queue.get(timeout=1.0)
-                if self.socketio and self.running:
-                    try:
-                        with self.socketio.server.app.app_context():
-                            self.socketio.emit('state_update', {'state': state_value}, namespace='/')
-                    except (RuntimeError, AssertionError) as e:
-                        if "start_response" not in str(e):
-                            pass
-                    except Exception:
-                        pass
-                self.state_queue.task_done()
-            except queue.Empty:
-                continue
-            except Exception:
-                pass
+            with self._state_cond:
+                # Sleep until a state arrives or stop() wakes us; no idle polling
+                while self.running and self._state_version == seen:
+                    self._state_cond.wait()
+            if not self.running:
+                break
+            time.sleep(_EMIT_COALESCE_SECONDS)
+            with self._state_cond:
+                seen = self._state_version
+                code = self._state_code
+            if code != last_code:
+                # A disconnected client surfaces here as a write error, which
+                # makes Werkzeug close this generator
+                yield _SSE_FRAMES[code]
+                last_code = code
     
     def emit_state_update(self, state):
         """Emit state update to all connected clients (thread-safe)."""
-        if self.running:
-            try:
-                self.state_queue.put_nowait(state.value)
-            except queue.Full:
-                pass
-            except Exception:
-                pass
+        code = _STATE_TO_CODE.get(state.value, 0)
+        if code == self._state_code:
+            # The UI already shows this (e.g. ready -> listening)
+            return
+        with self._state_cond:
+            self._state_code = code
+            self._state_version += 1
+            self._state_cond.notify_all()
     
     def start(self):
-        """Start the Flask server in a background thread."""
+        """Start the web server in a background thread."""
         if self.running:
             return
         
-        def run_server():
-            self.running = True
-            import logging
-            log = logging.getLogger('werkzeug')
-            log.setLevel(logging.CRITICAL)
-            
-            import sys
-            
-            class SuppressWSGIErrors:
-                def __init__(self, original):
-                    self.original = original
-                def write(self, s):
-                    msg = str(s)
-                    if "write() before start_response" not in msg and "AssertionError" not in msg:
-                        self.original.write(s)
-                def flush(self):
-                    self.original.flush()
-            
-            original_stderr = sys.stderr
-            sys.stderr = SuppressWSGIErrors(original_stderr)
-            
-            try:
-                self.emit_thread = threading.Thread(target=self._emit_worker, daemon=True)
-                self.emit_thread.start()
-                
-                self.socketio.run(
-                    self.app,
-                    host='127.0.0.1',
-                    port=self.port,
-                    debug=False,
-                    use_reloader=False,
-                    allow_unsafe_werkzeug=True,
-                    log_output=False
-                )
-            finally:
-                sys.stderr = original_stderr
-        
-        self.server_thread = threading.Thread(target=run_server, daemon=True)
+        # Bind in the caller's thread: once make_server returns the socket is
+        # already listening, so there's nothing to wait for before opening the
+        # browser, and a port clash raises here instead of dying in the thread
+        try:
+            self._httpd = make_server(
+                '127.0.0.1',
+                self.port,
+                self._wsgi_app,
+                threaded=True,
+                request_handler=_UIRequestHandler
+            )
+        except SystemExit:
+            # Werkzeug exits the process when the port is taken; only the UI should fail
+            raise OSError(f"Port {self.port} is already in use")
+        self.running = True
+        
+        logging.getLogger('werkzeug').setLevel(logging.CRITICAL)
+        
+        self.server_thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
         self.server_thread.start()
         
-        time.sleep(1)
-        
         if self.auto_open:
             try:
+                import webbrowser
                 webbrowser.open(f'http://127.0.0.1:{self.port}')
             except Exception as e:
                 print(f"Could not open browser automatically: {e}")
@@ -498,5 +516,18 @@ class WebUIServer:
         print(f"Robot web UI started at http://127.0.0.1:{self.port}")
     
     def stop(self):
-        """Stop the Flask server."""
+        """Stop the web server and release its port (start() may be called again)."""
         self.running = False
+        # Wake every open stream so it sees running=False and ends
+        with self._state_cond:
+            self._state_cond.notify_all()
+        
+        if self._httpd is not None:
+            # shutdown() returns once serve_forever has left its loop; the
+            # listening socket is only released by server_close()
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self.server_thread is not None:
+            self.server_thread.join(timeout=1.0)
+            self.server_thread = None
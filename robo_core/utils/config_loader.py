@@ -1,8 +1,20 @@
 import yaml
 import os
+import copy
 from pathlib import Path
 from dotenv import load_dotenv
 
+# libyaml's C parser when PyYAML was built with it, else the pure-Python one
+_SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Parsed config per path, with the mtime it was read at; an edited file
+# replaces its entry instead of adding one
+_config_cache = {}
+
+# .env files already applied to os.environ, and API keys already resolved
+_loaded_env_files = set()
+_api_key_cache = {}
+
 def load_config(config_file="config/settings.yaml"):
     """
     Load configuration from YAML file.
@@ -11,18 +23,27 @@ def load_config(config_file="config/settings.yaml"):
         config_file: Path to configuration file
         
     Returns:
-        Dictionary containing configuration
+        Dictionary containing configuration (a fresh copy; safe to modify)
     """
     config_path = Path(__file__).parent.parent.parent / config_file
     
-    if not config_path.exists():
+    path = str(config_path)
+    try:
+        mtime = config_path.stat().st_mtime_ns
+    except FileNotFoundError:
         # Return default config if file doesn't exist
         return get_default_config()
     
-    with open(config_path, 'r') as f:
-        config = yaml.safe_load(f) or {}
+    cached = _config_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        config = cached[1]
+    else:
+        with open(config_path, 'r') as f:
+            config = yaml.load(f, Loader=_SafeLoader) or {}
+        _config_cache[path] = (mtime, config)
     
-    return config
+    # Callers get their own copy, so none of them can alter the cached one
+    return copy.deepcopy(config)
 
 def get_default_config():
     """Return default configuration for Local VAD + OpenAI Realtime API pipeline."""
@@ -58,11 +79,15 @@ def load_env_file(env_file=".env"):
     Returns:
         True if .env file was loaded, False otherwise
     """
+    if env_file in _loaded_env_files:
+        return True
+    
     project_root = Path(__file__).parent.parent.parent
     env_path = project_root / env_file
     
     if env_path.exists():
         load_dotenv(env_path)
+        _loaded_env_files.add(env_file)
         return True
     return False
 
@@ -77,6 +102,10 @@ def get_api_key(env_var_name="OPENAI_API_KEY"):
     Returns:
         API key string or None if not found
     """
+    api_key = _api_key_cache.get(env_var_name)
+    if api_key is not None:
+        return api_key
+    
     # Try to load .env file first
     load_env_file()
     
@@ -85,7 +114,9 @@ def get_api_key(env_var_name="OPENAI_API_KEY"):
     
     # Return None if it's the placeholder value
     if api_key and api_key.strip() and api_key != "your-api-key-here":
-        return api_key.strip()
+        # Only found keys are cached, so a missing one is looked up again next time
+        _api_key_cache[env_var_name] = api_key.strip()
+        return _api_key_cache[env_var_name]
     
     return None
 
@@ -1,9 +1,25 @@
+import logging
 import torch
 import numpy as np
 from silero_vad import load_silero_vad
 
+logger = logging.getLogger(__name__)
+
+# Silero VAD scores 512-sample windows at 16kHz, each prefixed with the last
+# 64 samples of the previous window
+_WINDOW_SAMPLES = 512
+_CONTEXT_SAMPLES = 64
+
+# int16 PCM -> float32 in [-1.0, 1.0)
+_INT16_SCALE = np.float32(1.0 / 32768.0)
+
+# Optional smoothing: run the model on at most every 3rd chunk, unless the
+# chunk's energy moved more than 25% from the last scored one
+_SMOOTHING_STRIDE = 3
+_SMOOTHING_ENERGY_DEVIATION = 0.25
+
 class VADEngine:
-    def __init__(self, speech_threshold=0.5):
+    def __init__(self, speech_threshold=0.5, use_onnx=True, use_smoothing=False, model_path=None):
         """
         Initialize VAD Engine using Silero VAD model.
         Model will be downloaded on first run and cached for offline use.
@@ -12,11 +28,104 @@ class VADEngine:
             speech_threshold: Confidence threshold for speech detection (0.0-1.0). 
                             Higher values are more strict and reduce false positives from noise.
                             Default: 0.5
+            use_onnx: Run the bundled ONNX model directly with onnxruntime instead of
+                      the PyTorch model. Falls back to PyTorch if onnxruntime is missing.
+                      Default: True
+            use_smoothing: Reuse the last decision for chunks whose energy is close to the
+                           last scored chunk, scoring at most every 3rd such chunk.
+                           Fewer model calls at the cost of reaction time. Default: False
+            model_path: Path to an alternative Silero ONNX export (e.g. an int8-quantized one)
+                        with the same input/state/sr interface. Only used with use_onnx.
+                        Default: None (the model shipped with silero-vad)
         """
-        self.model = load_silero_vad()
-        self.model.eval()  # Set to evaluation mode
         self.sample_rate = 16000  # Silero VAD expects 16kHz
         self.speech_threshold = speech_threshold
+        self.use_smoothing = use_smoothing
+        self._last_decision = False
+        self._last_energy = None
+        self._chunks_until_score = 0
+        self._inference_error_logged = False
+        self.session = None
+        self.model = None
+        
+        if use_onnx:
+            try:
+                self.session = self._create_onnx_session(model_path)
+            except Exception as e:
+                logger.warning(f"ONNX Runtime VAD unavailable ({e}); using PyTorch model")
+        
+        if self.session is not None:
+            # Recurrent state and the [context | window] input are reused across calls
+            self._state = np.zeros((2, 1, 128), dtype=np.float32)
+            self._input = np.zeros((1, _CONTEXT_SAMPLES + _WINDOW_SAMPLES), dtype=np.float32)
+            self._sr = np.array(self.sample_rate, dtype=np.int64)
+        else:
+            self.model = load_silero_vad()
+            self.model.eval()  # Set to evaluation mode
+            self._f32 = np.empty(_WINDOW_SAMPLES, dtype=np.float32)
+
+    def _create_onnx_session(self, model_path=None):
+        """Create a single-threaded CPU session for model_path, or the model shipped with silero-vad."""
+        import onnxruntime as ort
+        from importlib import resources
+        
+        if model_path is None:
+            model_path = str(resources.files("silero_vad.data").joinpath("silero_vad.onnx"))
+        opts = ort.SessionOptions()
+        # One 512-sample window is far too small to benefit from thread fan-out
+        opts.intra_op_num_threads = 1
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Tensors are tiny and batch is always 1: skip the arena, memory-pattern
+        # planning and weight prepacking, which mostly add resident memory here
+        opts.enable_cpu_mem_arena = False
+        opts.enable_mem_pattern = False
+        opts.add_session_config_entry("session.disable_prepacking", "1")
+        session = ort.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        
+        # Older (v4) and third-party exports use h/c state tensors; reject them here
+        # rather than failing every call and silently reporting "no speech"
+        input_names = {i.name for i in session.get_inputs()}
+        if input_names != {"input", "state", "sr"}:
+            raise ValueError(f"{model_path} has inputs {sorted(input_names)}, expected input/state/sr")
+        logger.info(f"VAD running on ONNX Runtime ({model_path})")
+        return session
+
+    def _onnx_speech_prob(self, chunk):
+        """Score one window with ONNX Runtime, carrying context and state like Silero's wrapper."""
+        samples = (chunk if isinstance(chunk, np.ndarray) else np.asarray(chunk, dtype=np.float32)).reshape(-1)
+        if samples.shape[0] != _WINDOW_SAMPLES:
+            raise ValueError(f"Expected {_WINDOW_SAMPLES} samples, got {samples.shape[0]}")
+        
+        # Last window's tail becomes this window's context, then the new samples follow
+        self._input[0, :_CONTEXT_SAMPLES] = self._input[0, -_CONTEXT_SAMPLES:]
+        window = self._input[0, _CONTEXT_SAMPLES:]
+        if samples.dtype == np.int16:
+            # Scale PCM straight into the model input, no temporary array
+            np.multiply(samples, _INT16_SCALE, out=window)
+        else:
+            window[:] = samples
+        out, self._state = self.session.run(
+            None, {"input": self._input, "state": self._state, "sr": self._sr}
+        )
+        return float(out[0, 0])
+
+    def reset_state(self):
+        """
+        Forget all audio seen so far: recurrent state, context and smoothing.
+        
+        Call after a gap in the stream (e.g. while a Realtime session bypassed
+        the gate) so the next chunks aren't scored against stale history.
+        """
+        self._last_decision = False
+        self._last_energy = None
+        self._chunks_until_score = 0
+        if self.session is not None:
+            self._state.fill(0.0)
+            self._input.fill(0.0)
+        else:
+            self.model.reset_states()
 
     def is_speech(self, chunk):
         """
@@ -28,8 +137,42 @@ class VADEngine:
         Returns:
             True if speech detected, False otherwise
         """
+        if not self.use_smoothing:
+            return self._classify(chunk)
+        
+        samples = np.asarray(chunk, dtype=np.float32).reshape(-1)
+        energy = float(np.dot(samples, samples))
+        if (self._chunks_until_score > 0 and self._last_energy is not None
+                and abs(energy - self._last_energy) <= _SMOOTHING_ENERGY_DEVIATION * self._last_energy):
+            # Steady signal: keep the last decision and skip the model
+            self._chunks_until_score -= 1
+            return self._last_decision
+        
+        self._last_decision = self._classify(chunk)
+        self._last_energy = energy
+        self._chunks_until_score = _SMOOTHING_STRIDE - 1
+        return self._last_decision
+
+    def _classify(self, chunk):
+        """Run the model on one chunk and apply the speech threshold."""
+        if self.session is not None:
+            try:
+                return self._onnx_speech_prob(chunk) > self.speech_threshold
+            except Exception:
+                # Same contract as the PyTorch path: bad input is "no speech".
+                # Say so once, though: a wrong chunk size would otherwise turn
+                # the gate into "never speech" without a trace
+                if not self._inference_error_logged:
+                    self._inference_error_logged = True
+                    logger.warning("VAD inference failed; treating chunks as silence", exc_info=True)
+                return False
+        
         # Convert to tensor if needed
-        if isinstance(chunk, np.ndarray):
+        if isinstance(chunk, np.ndarray) and chunk.dtype == np.int16 and chunk.size == _WINDOW_SAMPLES:
+            # int16 PCM: scale into the reusable float32 buffer and wrap it without copying
+            np.multiply(chunk.reshape(-1), _INT16_SCALE, out=self._f32)
+            audio_tensor = torch.from_numpy(self._f32)
+        elif isinstance(chunk, np.ndarray):
             audio_tensor = torch.from_numpy(chunk).float()
         else:
             audio_tensor = torch.tensor(chunk, dtype=torch.float32)
@@ -42,8 +185,8 @@ class VADEngine:
             return False
         
         # Silero VAD expects 16kHz sample rate
-        # Process with no gradient computation for efficiency
-        with torch.no_grad():
+        # inference_mode also skips view/version-counter tracking that no_grad keeps
+        with torch.inference_mode():
             try:
                 speech_prob = self.model(audio_tensor, self.sample_rate).item()
                 return speech_prob > self.speech_threshold
@@ -2,29 +2,36 @@
 Simplified robot pipeline using OpenAI Realtime API.
 Uses local VAD as a cost gate, then activates Realtime API for seamless voice conversations.
 """
+import logging
+import socket
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 import numpy as np
 from robo_core.audio.microphone_stream import MicrophoneStream
 from robo_core.vad.vad_engine import VADEngine
 from robo_core.realtime.realtime_client import RealtimeAPIClient
-from robo_core.audio.playback import AudioPlayer
+from robo_core.audio.playback import AudioPlayer, raise_thread_priority
 from robo_core.utils.logger import get_logger
 from robo_core.utils.config_loader import load_config, get_api_key
 from robo_core.ui.robot_state import RobotState, RobotStateManager
-from robo_core.ui.web_ui_server import WebUIServer
 
 logger = get_logger(__name__)
 
+# Upper bound on one blocking stream.write (150ms of 24kHz PCM16): the stop
+# flag is only checked between writes, so this bounds cancel/barge-in latency
+_MAX_WRITE_SAMPLES = 3600
+
 
 def check_internet_connectivity(host="8.8.8.8", port=53, timeout=3):
     """Check if internet connectivity is available."""
+    # Per-socket timeout: setdefaulttimeout() would leak into every socket the
+    # process opens afterwards (web UI connections, the Realtime websocket)
     try:
-        import socket
-        socket.setdefaulttimeout(timeout)
-        socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect((host, port))
-        return True
-    except (socket.error, OSError):
+        with closing(socket.create_connection((host, port), timeout=timeout)):
+            return True
+    except OSError:
         return False
 
 
@@ -54,7 +61,12 @@ class RealtimePipeline:
         
         # Local VAD for cost gate
         vad_config = config.get("vad", {})
-        self.vad = VADEngine(speech_threshold=vad_config.get("speech_threshold", 0.5))
+        self.vad = VADEngine(
+            speech_threshold=vad_config.get("speech_threshold", 0.5),
+            use_onnx=vad_config.get("use_onnx", True),
+            use_smoothing=vad_config.get("use_smoothing", False),
+            model_path=vad_config.get("model_path")
+        )
         
         # Realtime API client
         api_key = get_api_key("OPENAI_API_KEY")
@@ -81,7 +93,20 @@ class RealtimePipeline:
         self.response_audio_lock = threading.Lock()
         self.response_thread = None
         self.playing_response = False
-        self._stop_playback = threading.Event()  # Event to signal playback thread to stop
+        # Event to signal playback thread to stop; each playback thread gets a
+        # fresh one, so stopping an old thread can never be undone for it
+        self._stop_playback = threading.Event()
+        
+        # Response output stream: opened by the first response of a session and
+        # kept until the session closes, so later turns skip the device open.
+        # Only the playback thread whose stop event is _out_stream_owner may
+        # write to, stop or abort it, and only while holding _out_stream_lock
+        self._out_stream = None
+        self._out_stream_owner = None
+        self._out_stream_lock = threading.Lock()
+        # Coalesced chunks are copied here instead of joined into a new bytes
+        # object; 1s of 24kHz PCM16, grown if a burst is ever larger
+        self._pcm_scratch = np.empty(24000, dtype=np.int16)
         
         # Setup event handlers
         self._setup_event_handlers()
@@ -91,7 +116,7 @@ class RealtimePipeline:
         
         def on_speech_started(event):
             """Local VAD detected speech - transition to LISTENING."""
-            logger.info(f"EVENT: input_audio_buffer.speech_started - {event}")
+            logger.info("EVENT: input_audio_buffer.speech_started - %s", event)
             
             # CRITICAL: Ignore speech detection while robot is speaking
             # This prevents feedback loop where robot's own voice triggers new responses
@@ -106,7 +131,7 @@ class RealtimePipeline:
                     logger.info("Connecting to Realtime API...")
                     self.realtime_client.connect()
                     self.realtime_session_active = True
-                    self.last_interaction_time = time.time()
+                    self.last_interaction_time = time.monotonic()
                     logger.info("✓ Realtime API session activated and connected")
                 except Exception as e:
                     logger.error(f"✗ Failed to activate Realtime API session: {e}", exc_info=True)
@@ -120,7 +145,7 @@ class RealtimePipeline:
         
         def on_input_committed(event):
             """Input audio committed - transition to THINKING."""
-            logger.info(f"EVENT: input_audio_buffer.committed - {event}")
+            logger.info("EVENT: input_audio_buffer.committed - %s", event)
             if self.realtime_session_active:
                 logger.info("STATE: LISTENING → THINKING")
                 self.state_manager.set_state(RobotState.THINKING)
@@ -135,11 +160,11 @@ class RealtimePipeline:
         
         def on_response_created(event):
             """Response created - log it."""
-            logger.info(f"EVENT: response.created - {event}")
+            logger.info("EVENT: response.created - %s", event)
         
         def on_response_output_item_added(event):
             """Response output item added - might contain audio."""
-            logger.info(f"EVENT: response.output_item.added - {event}")
+            logger.info("EVENT: response.output_item.added - %s", event)
             item = event.get("item", {})
             if item.get("type") == "message":
                 content = item.get("content", [])
@@ -149,8 +174,9 @@ class RealtimePipeline:
         
         def on_response_audio_delta(event):
             """Response audio chunk received - transition to TALKING and play audio."""
-            audio_size = len(event.get("delta", "")) if event.get("delta") else 0
-            logger.debug(f"EVENT: response.audio.delta - received {audio_size} bytes of audio")
+            delta = event.get("delta")
+            audio_size = len(delta) if delta else 0
+            logger.debug("EVENT: response.audio.delta - received %d bytes of audio", audio_size)
             
             # IMMEDIATE TRANSITION: Switch to TALKING as soon as we get ANY audio data
             if not self.playing_response and audio_size > 0:
@@ -171,38 +197,38 @@ class RealtimePipeline:
                     self.playing_response = False
                     self.player.stop()  # Stop audio playback immediately
                     self.response_thread.join(timeout=1.0)  # Wait for it to stop
+                    if self.response_thread.is_alive():
+                        # Still blocked in a write; it loses the stream to the new
+                        # thread and exits at its next write
+                        logger.warning("Previous playback thread did not stop within 1s")
                     # Clear old audio from previous response
-                    cleared = 0
-                    while True:
-                        audio = self.realtime_client.get_response_audio()
-                        if audio is None:
-                            break
-                        cleared += 1
+                    cleared = self.realtime_client.clear_response_audio()
                     if cleared > 0:
                         logger.info(f"Cleared {cleared} old audio chunks from previous response")
                 
-                # ALWAYS clear stop_playback before starting a new thread
-                # (it might be set from a previous cancelled response)
-                self._stop_playback.clear()
+                # Fresh stop event for the new thread; an old thread keeps its
+                # own (already set) event instead of being revived by a clear()
+                self._stop_playback = threading.Event()
                 
                 # Start playing response (the current chunk is already in the queue)
                 self.playing_response = True
                 
                 # Start new response playback thread
                 logger.info("Starting audio playback thread...")
-                self.response_thread = threading.Thread(target=self._play_response_audio, daemon=True)
+                self.response_thread = threading.Thread(target=self._play_response_audio, args=(self._stop_playback,), daemon=True)
                 self.response_thread.start()
         
         def on_response_output_audio_delta(event):
             """Response output audio delta received - same handling as audio delta."""
-            audio_size = len(event.get("delta", "")) if event.get("delta") else 0
-            logger.debug(f"EVENT: response.output_audio.delta - received {audio_size} bytes of audio")
+            # Per-delta hot path: don't size the payload unless it will be logged
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("EVENT: response.output_audio.delta - received %d bytes of audio", len(event.get("delta") or ""))
             # Treat same as audio delta
             on_response_audio_delta(event)
         
         def on_response_output_audio(event):
             """Response output audio received - same handling as delta."""
-            logger.debug(f"EVENT: response.output_audio")
+            logger.debug("EVENT: response.output_audio")
             # Treat same as audio delta
             on_response_audio_delta(event)
         
@@ -211,7 +237,7 @@ class RealtimePipeline:
             response = event.get("response", {})
             status = response.get("status", "")
             queue_size = self.realtime_client.get_queue_size()
-            logger.info(f"EVENT: response.done - status: {status}, audio queue size: {queue_size}")
+            logger.info("EVENT: response.done - status: %s, audio queue size: %d", status, queue_size)
             
             # If response was cancelled, stop playback immediately
             # BUT don't clear the queue - the audio might still be valid for the next response
@@ -232,7 +258,7 @@ class RealtimePipeline:
             if status == "cancelled":
                 self.playing_response = False
             
-            self.last_interaction_time = time.time()
+            self.last_interaction_time = time.monotonic()
             
             # Let the audio playback thread handle state transitions
             # This prevents conflicting state changes
@@ -256,55 +282,160 @@ class RealtimePipeline:
         self.realtime_client.on_event("response.done", on_response_done)
         self.realtime_client.on_event("conversation.item.completed", on_conversation_end)
     
-    def _play_response_audio(self):
-        """Play response audio chunks as they arrive using a continuous stream."""
+    def _acquire_output_stream(self, owner, blocksize):
+        """Make owner the user of the session's output stream, opening and starting it as needed."""
+        with self._out_stream_lock:
+            if self._out_stream is None:
+                import sounddevice as sd
+                # The Realtime API delivers PCM16, so hand it to PortAudio as-is
+                self._out_stream = sd.OutputStream(samplerate=24000, channels=1, dtype='int16', blocksize=blocksize)
+                logger.info("Audio stream opened")
+            elif self._out_stream_owner is not None and self._out_stream.active:
+                # Taking over from a thread that never released it: drop its buffered audio
+                self._out_stream.abort()
+            self._out_stream_owner = owner
+            if not self._out_stream.active:
+                self._out_stream.start()
+    
+    def _write_output_stream(self, owner, samples):
+        """
+        Write samples to the output stream on behalf of owner.
+        
+        Returns:
+            False if owner no longer holds the stream (taken over or closed)
+        """
+        with self._out_stream_lock:
+            if self._out_stream is None or self._out_stream_owner is not owner:
+                return False
+            self._out_stream.write(samples)
+            return True
+    
+    def _release_output_stream(self, owner, drain):
+        """Pause the output stream if owner still holds it; it stays open for the next response."""
+        with self._out_stream_lock:
+            if self._out_stream is None or self._out_stream_owner is not owner:
+                return
+            self._out_stream_owner = None
+            try:
+                # stop() lets buffered audio play out, abort() drops it
+                if drain:
+                    self._out_stream.stop()
+                else:
+                    self._out_stream.abort()
+                logger.info("Audio stream stopped")
+            except:
+                pass
+    
+    def _close_output_stream(self):
+        """Close the response output stream (reopened by the next response)."""
+        with self._out_stream_lock:
+            if self._out_stream is not None:
+                try:
+                    self._out_stream.abort()
+                    self._out_stream.close()
+                    logger.info("Audio stream closed")
+                except:
+                    pass
+                self._out_stream = None
+                self._out_stream_owner = None
+    
+    def _gather_pcm(self, chunks):
+        """Copy PCM16 chunks back to back into the scratch buffer and return the filled slice."""
+        total = sum(len(chunk) for chunk in chunks) // 2
+        if total > self._pcm_scratch.shape[0]:
+            self._pcm_scratch = np.empty(total, dtype=np.int16)
+        offset = 0
+        for chunk in chunks:
+            samples = np.frombuffer(chunk, dtype=np.int16)
+            self._pcm_scratch[offset:offset + samples.shape[0]] = samples
+            offset += samples.shape[0]
+        return self._pcm_scratch[:offset]
+    
+    def _play_response_audio(self, stop):
+        """
+        Play response audio chunks as they arrive using a continuous stream.
+        
+        Args:
+            stop: This thread's stop event; also identifies it as the output stream's owner
+        """
         logger.info("Audio playback thread started")
         total_bytes = 0
         chunks_received = 0
         empty_count = 0
-        max_empty_count = 20   # Ultra-short timeout for instant responsiveness (0.1 seconds)
+        max_empty_count = 20   # Ultra-short timeout for instant responsiveness (20 x 5ms waits = 0.1 seconds)
         
         # Use a single continuous stream for smoother playback
-        import sounddevice as sd
-        stream = None
+        acquired = False
+        
+        # With real-time priority the thread isn't preempted mid-write, so a
+        # 20ms block is safe; otherwise keep the 200ms block that hides jitter
+        realtime = raise_thread_priority()
+        blocksize = 480 if realtime else 4800
+        logger.info(f"Playback thread real-time priority: {realtime} (blocksize {blocksize})")
         
         try:
-            # Open a continuous audio stream with larger blocksize for smoother playback
-            # blocksize=4800 = 200ms buffer at 24kHz (reduces jerky playback)
-            stream = sd.OutputStream(samplerate=24000, channels=1, dtype='float32', blocksize=4800)
-            stream.start()
-            logger.info("Audio stream opened and started")
+            # Reuse the session's audio stream (opened on the first response)
+            self._acquire_output_stream(stop, blocksize)
+            acquired = True
+            logger.info("Audio stream started")
             
             # Log initial queue size
             initial_queue_size = self.realtime_client.get_queue_size()
             logger.info(f"Initial audio queue size: {initial_queue_size} chunks")
             
+            # Per-chunk logs are DEBUG; check the level once per response rather
+            # than building their messages (and queue sizes) on every chunk
+            log_chunks = logger.isEnabledFor(logging.DEBUG)
+            
             # Keep playing until we've drained the queue or stopped
             # Don't exit just because playing_response is False - wait for queue to drain
-            while not self._stop_playback.is_set() and empty_count < max_empty_count:
+            while not stop.is_set() and empty_count < max_empty_count:
                 # Check if we should stop
-                if self._stop_playback.is_set():
+                if stop.is_set():
                     logger.info("Playback thread received stop signal")
                     break
                 
-                # Get audio chunk from Realtime API
-                queue_size_before = self.realtime_client.get_queue_size()
-                audio_bytes = self.realtime_client.get_response_audio()
-                queue_size_after = self.realtime_client.get_queue_size()
+                # Get audio chunk from Realtime API, waking as soon as one is queued
+                if log_chunks:
+                    queue_size_before = self.realtime_client.get_queue_size()
+                audio_bytes = self.realtime_client.get_response_audio(timeout=0.005)
                 
                 if audio_bytes:
-                    empty_count = 0  # Reset empty count
-                    chunks_received += 1
-                    total_bytes += len(audio_bytes)
-                    logger.info(f"Audio playback: received chunk {chunks_received} ({len(audio_bytes)} bytes, total: {total_bytes} bytes, queue: {queue_size_before}->{queue_size_after})")
+                    # Fold whatever else is already queued into the same write,
+                    # up to about _MAX_WRITE_SAMPLES so a burst stays interruptible
+                    chunks = [audio_bytes]
+                    pending = len(audio_bytes) // 2
+                    while pending < _MAX_WRITE_SAMPLES:
+                        extra = self.realtime_client.get_response_audio()
+                        if extra is None:
+                            break
+                        chunks.append(extra)
+                        pending += len(extra) // 2
                     
-                    # Convert to numpy array (PCM16, 24kHz)
-                    audio_array = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32) / 32767.0
+                    if len(chunks) == 1:
+                        # Zero-copy view of the PCM16 (24kHz) bytes; no float conversion needed
+                        audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
+                    else:
+                        audio_array = self._gather_pcm(chunks)
+                    burst_bytes = audio_array.nbytes
                     
-                    # Write to stream (non-blocking)
+                    empty_count = 0  # Reset empty count
+                    chunks_received += len(chunks)
+                    total_bytes += burst_bytes
+                    if log_chunks:
+                        queue_size_after = self.realtime_client.get_queue_size()
+                        logger.debug(f"Audio playback: received {len(chunks)} chunk(s), {chunks_received} so far ({burst_bytes} bytes, total: {total_bytes} bytes, queue: {queue_size_before}->{queue_size_after})")
+                    
+                    # Write in slices of at most _MAX_WRITE_SAMPLES, re-checking the
+                    # stop flag in between (a single delta can itself be long)
                     try:
-                        if not self._stop_playback.is_set():
-                            stream.write(audio_array.reshape(-1, 1))
+                        for start in range(0, audio_array.shape[0], _MAX_WRITE_SAMPLES):
+                            if stop.is_set():
+                                break
+                            if not self._write_output_stream(stop, audio_array[start:start + _MAX_WRITE_SAMPLES].reshape(-1, 1)):
+                                logger.info("Audio stream taken over or closed - stopping playback")
+                                stop.set()
+                                break
                     except Exception as e:
                         logger.error(f"Error writing to audio stream: {e}")
                         break
@@ -313,8 +444,8 @@ class RealtimePipeline:
                     queue_size = self.realtime_client.get_queue_size()
                     
                     # Log first few empty reads to debug
-                    if empty_count <= 5 or empty_count % 20 == 0:
-                        logger.info(f"Empty read {empty_count}/{max_empty_count}, queue size: {queue_size}, playing_response: {self.playing_response}, stop_playback: {self._stop_playback.is_set()}")
+                    if log_chunks and (empty_count <= 5 or empty_count % 20 == 0):
+                        logger.debug(f"Empty read {empty_count}/{max_empty_count}, queue size: {queue_size}, playing_response: {self.playing_response}, stop_playback: {stop.is_set()}")
                     
                     # If queue has items but we're getting None, something is wrong
                     if queue_size > 0 and empty_count > 5:
@@ -329,29 +460,24 @@ class RealtimePipeline:
                     if not self.playing_response and empty_count >= 10:  # 50ms instead of 20ms
                         logger.info(f"Response done, waited {empty_count} reads - exiting conservatively")
                         break
-                    
-                    # Shorter delay for faster responsiveness
-                    time.sleep(0.005)  # 5ms instead of 10ms
             
         except Exception as e:
             logger.error(f"Error in audio playback thread: {e}", exc_info=True)
         finally:
-            # Clean up stream
-            if stream is not None:
-                try:
-                    stream.stop()
-                    stream.close()
-                    logger.info("Audio stream closed")
-                except:
-                    pass
+            # Pause the stream but keep it open for the next response
+            # (a no-op if another thread has taken it over)
+            if acquired:
+                self._release_output_stream(stop, drain=not stop.is_set())
             
-            # CRITICAL: Mark playback as finished and transition to LISTENING
-            self.playing_response = False
-            if self.realtime_session_active:
-                logger.info("STATE: TALKING → LISTENING (playback finished)")
-                self.state_manager.set_state(RobotState.LISTENING)
-                if self.ui_enabled:
-                    self.web_ui_server.emit_state_update(RobotState.LISTENING)
+            # CRITICAL: Mark playback as finished and transition to LISTENING,
+            # unless this thread was superseded and the new one owns that
+            if stop is self._stop_playback:
+                self.playing_response = False
+                if self.realtime_session_active:
+                    logger.info("STATE: TALKING → LISTENING (playback finished)")
+                    self.state_manager.set_state(RobotState.LISTENING)
+                    if self.ui_enabled:
+                        self.web_ui_server.emit_state_update(RobotState.LISTENING)
         
         logger.info(f"Audio playback thread finished (total: {chunks_received} chunks, {total_bytes} bytes)")
     
@@ -359,6 +485,14 @@ class RealtimePipeline:
         """Close Realtime API session and return to READY state."""
         if self.realtime_session_active:
             self.realtime_client.disconnect()
+            # Stop playback before closing the stream it writes to
+            self._stop_playback.set()
+            thread = self.response_thread
+            if thread is not None and thread is not threading.current_thread():
+                thread.join(timeout=1.0)
+            self._close_output_stream()
+            # The gate skipped the model for the whole session; start it fresh
+            self.vad.reset_state()
             self.realtime_session_active = False
             self.last_interaction_time = None
             self.playing_response = False
@@ -381,8 +515,9 @@ class RealtimePipeline:
         # Main loop: stream microphone audio
         for chunk in self.mic.stream_chunks():
             # Check for session timeout
-            if self.realtime_session_active and self.last_interaction_time:
-                time_since_last = time.time() - self.last_interaction_time
+            # Monotonic clock: an NTP step or manual clock change can't expire or extend the session
+            if self.realtime_session_active and self.last_interaction_time is not None:
+                time_since_last = time.monotonic() - self.last_interaction_time
                 if time_since_last > self.session_timeout:
                     logger.info(f"Session timeout after {time_since_last:.1f}s - closing session")
                     self._close_session()
@@ -394,36 +529,35 @@ class RealtimePipeline:
                 # Robot is speaking - mute microphone input to prevent feedback
                 continue
             
+            # Session open: the Realtime API does its own turn detection, so the
+            # local gate has nothing to decide and every chunk is forwarded
+            if self.realtime_session_active:
+                self.realtime_client.send_audio(chunk, sample_rate=self.mic.rate)
+                continue
+            
             # Local VAD detection (cost gate)
             if self.vad.is_speech(chunk):
                 logger.debug("VAD: Speech detected")
-                # Speech detected - trigger event handler which will activate Realtime API if needed
-                if not self.realtime_session_active:
-                    logger.info("VAD: Activating Realtime API session...")
-                    # Simulate speech_started event to activate session
-                    self.realtime_client.event_handlers.get("input_audio_buffer.speech_started", lambda x: None)({})
+                # Speech detected - trigger event handler which will activate Realtime API
+                logger.info("VAD: Activating Realtime API session...")
+                # Simulate speech_started event to activate session
+                self.realtime_client.event_handlers.get("input_audio_buffer.speech_started", lambda x: None)({})
                 
-                # Send audio to Realtime API if session is active
+                # Send audio to Realtime API if session is now active
                 if self.realtime_session_active:
                     self.realtime_client.send_audio(chunk, sample_rate=self.mic.rate)
                     logger.debug("VAD: Audio chunk sent to Realtime API (speech)")
-            else:
-                # No speech - if session is active, still send audio (Realtime API handles VAD)
-                if self.realtime_session_active:
-                    self.realtime_client.send_audio(chunk, sample_rate=self.mic.rate)
-                    logger.debug("VAD: Audio chunk sent to Realtime API (silence)")
-
 
 def main():
     """Main entry point."""
     # Load configuration
     config = load_config()
     
-    # Check internet connectivity
-    has_internet = check_internet_connectivity()
-    if not has_internet:
-        logger.error("No internet connectivity. Realtime API requires internet connection.")
-        return
+    # Check internet connectivity in the background while the UI starts;
+    # the check can take up to its full timeout on a bad network
+    connectivity_pool = ThreadPoolExecutor(max_workers=1)
+    internet_check = connectivity_pool.submit(check_internet_connectivity)
+    connectivity_pool.shutdown(wait=False)
     
     # Initialize UI
     state_manager = RobotStateManager()
@@ -435,6 +569,8 @@ def main():
     web_ui_server = None
     if ui_enabled:
         try:
+            # The web server stack is only imported when the UI is actually used
+            from robo_core.ui.web_ui_server import WebUIServer
             web_ui_server = WebUIServer(
                 state_manager=state_manager,
                 port=ui_port,
@@ -445,6 +581,12 @@ def main():
             logger.warning(f"Failed to start robot web UI: {e}. Continuing without UI.")
             ui_enabled = False
     
+    if not internet_check.result():
+        logger.error("No internet connectivity. Realtime API requires internet connection.")
+        if web_ui_server:
+            web_ui_server.stop()
+        return
+    
     # Initialize and run pipeline
     try:
         pipeline = RealtimePipeline(config, state_manager, web_ui_server)